@@ -8,13 +8,15 @@ from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.types import Message
 
-from disney import DisneyPlus, Data
-from config import token, users, groups
+from disney import DisneyPlus, Data, Batch
+import config
 
 
-API_TOKEN = token
-USERS = users
-GROUPS = groups
+API_TOKEN = config.token
+USERS = config.users
+GROUPS = config.groups
+EPISODE_PAGE_SIZE = getattr(config, "episode_page_size", Data.EPISODE_PAGE_SIZE)
+EPISODE_PREFETCH = getattr(config, "episode_prefetch", Data.EPISODE_PREFETCH)
 
 bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
@@ -100,10 +102,13 @@ async def send_help(message: Message):
     await message.answer(
         """
 <b>Usage:</b>
-<code>/check [-r &lt;regions&gt;] [-s &lt;num&gt;] [-q &lt;value&gt;] [-al &lt;lang&gt;] [-sl &lt;lang&gt;] &lt;url&gt;</code>
+<code>/check [-r &lt;regions&gt;] [-s &lt;num&gt;] [-q &lt;value&gt;] [-al &lt;lang&gt;] [-sl &lt;lang&gt;] &lt;url&gt; [&lt;url&gt; ...]</code>
+<code>/compare [-r &lt;regions&gt;] [-s &lt;num&gt;] [-q &lt;value&gt;] [-al &lt;lang&gt;] [-sl &lt;lang&gt;] &lt;url&gt; &lt;url&gt; [&lt;url&gt; ...]</code>
 
 Finds which regions a movie or series is available in on Disney+.
 For TV shows, also returns a list of seasons and the number of matching episodes in each season.
+With several URLs, every title is checked in the same pass over the regions and the result is a single matrix of which titles are available in which regions.
+In the matrix, a TV show counts as available in a region only if at least one episode matches the given filters.
 
 <b>Example:</b>
 <code>/check -r us,fr -sl pl -al pl https://www.disneyplus.com/movies/star-wars-attack-of-the-clones-episode-ii/mgpYHGnzZW6N</code>
@@ -124,59 +129,107 @@ async def send_regions(message: Message):
     )
 
 
-@dp.message(Command("check"))
-async def send_check(message: Message):
-    """Handles `/check` command."""
-    if not await eligible("check", message):
-        return
-
-    parser = MyArgumentParser(description="DSNPbot", prog="/check")
+def check_parser(prog: str) -> MyArgumentParser:
+    parser = MyArgumentParser(description="DSNPbot", prog=prog)
     parser.add_argument("-sl", "--slang", type=str, default=None)
     parser.add_argument("-al", "--alang", type=str, default=None)
     parser.add_argument("-ml", "--mlang", type=str, default=None)
     parser.add_argument("-r", "--regions", type=str, default=None)
     parser.add_argument("-q", "--quality", type=str, default=None)
     parser.add_argument("-s", "--seasons", type=str, default=None)
-    parser.add_argument("url", type=str, default=None)
+    parser.add_argument("url", type=str, nargs="+", default=None)
+
+    return parser
+
+
+async def parse_check(message: Message, prog: str, min_urls: int = 1):
+    """Validates the `/check` style arguments and checks the titles."""
+    parser = check_parser(prog)
 
     message_text: str = message.text or ""
-    args = parser.parse_args(message_text.split()[1:])  # Remove "/check" from arguments
+    args = parser.parse_args(message_text.split()[1:])  # Remove the command from arguments
 
     if parser.error_message:
         await message.answer(parser.error_message, disable_web_page_preview=True)
         return
 
-    if args and "http" in args.url:
-        if args.quality and args.quality.upper() not in ["SD", "HD", "UHD"]:
-            await message.answer("Error: Invalid quality!")
-        else:
-            logging.info(f"URL: {args.url}")
-            sent_message = await message.answer("Checking...")
+    if not args or not all("http" in url for url in args.url):
+        await message.answer("Error: No usable input!")
+    elif len(args.url) < min_urls:
+        await message.answer(f"Error: At least {min_urls} URLs are needed!")
+    elif len(args.url) > Batch.MAX_TITLES:
+        await message.answer(
+            f"Error: At most {Batch.MAX_TITLES} URLs can be checked at once!"
+        )
+    elif args.quality and args.quality.upper() not in ["SD", "HD", "UHD"]:
+        await message.answer("Error: Invalid quality!")
+    else:
+        await check_titles(message, args, args.url)
+
 
-            if "browse/entity" in args.url:
+async def check_titles(message: Message, args, urls: list[str]):
+    """Sweeps the regions once for all titles.
+
+    A single title gets the detailed answer, several titles a combined matrix.
+    """
+    logging.info(f"URLs: {', '.join(urls)}")
+    sent_message = await message.answer("Checking...")
+
+    try:
+        titles: list[Data] = list()
+        for url in urls:
+            if "browse/entity" in url:
                 await sent_message.edit_text(
-                    "Error: Entity URL detected, only old URLs can be used!"
+                    f"Error: Entity URL detected, only old URLs can be used! ({url})",
+                    disable_web_page_preview=True,
                 )
                 logging.warning(
                     "Error: Entity URL detected, only old URLs can be used!"
                 )
                 return
 
-            try:
-                data = Data(args, sent_message, bot)
-                if data.id:
-                    await bot.disney.get_available(data)
-                    logging.info(f"Finished: {data.id}")
-                else:
-                    await sent_message.edit_text("Error: Failed to get title ID!")
-                    logging.warning("Error: Failed to get title ID!")
-            except Exception as e:
+            data = Data(
+                argparse.Namespace(**{**vars(args), "url": url}),
+                sent_message,
+                bot,
+                page_size=EPISODE_PAGE_SIZE,
+                prefetch=EPISODE_PREFETCH,
+            )
+            if not data.id:
                 await sent_message.edit_text(
-                    f"Error: {e}", disable_web_page_preview=True
+                    f"Error: Failed to get title ID! ({url})",
+                    disable_web_page_preview=True,
                 )
-                logging.error(f"Error: {e}")
-    else:
-        await message.answer("Error: No usable input!")
+                logging.warning("Error: Failed to get title ID!")
+                return
+            titles.append(data)
+
+        if len(titles) > 1:
+            await bot.disney.get_available(Batch(titles, sent_message, bot))
+        else:
+            await bot.disney.get_available(titles[0])
+        logging.info(f"Finished: {', '.join(data.id for data in titles)}")
+    except Exception as e:
+        await sent_message.edit_text(f"Error: {e}", disable_web_page_preview=True)
+        logging.error(f"Error: {e}")
+
+
+@dp.message(Command("compare"))
+async def send_compare(message: Message):
+    """Handles `/compare` command."""
+    if not await eligible("compare", message):
+        return
+
+    await parse_check(message, "/compare", min_urls=2)
+
+
+@dp.message(Command("check"))
+async def send_check(message: Message):
+    """Handles `/check` command."""
+    if not await eligible("check", message):
+        return
+
+    await parse_check(message, "/check")
 
 
 async def main():
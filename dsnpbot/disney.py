@@ -2,11 +2,21 @@ from __future__ import annotations
 
 from types import SimpleNamespace
 from typing import Optional, Any
+import asyncio
+import math
+import os
 import re
 
 from aiogram import types
 import aiohttp
 
+from regions import (
+    DISNEYPLUS_REGIONS,
+    STARPLUS_REGIONS,
+    RegionCatalog,
+    registerdisney_source,
+)
+
 
 async def edit_text(sent_message: types.Message, message: str) -> None:
     await sent_message.edit_text(
@@ -21,36 +31,28 @@ class Data:
         r"^https?://(?:www\.)?(?:preview\.)?(?P<site>disneyplus|starplus)\.com(?:/[a-z0-9-]+){,2}/(?P<type>movies|series)(?:/[a-zA-Z0-9%_-]+)?/(?P<id>[a-zA-Z0-9]{12})",
         r"^https?://(?:www\.)?dsny\.pl/library/[a-zA-Z]{2}(?:/[a-zA-Z]{2})?/(?P<id>[a-zA-Z0-9]{12})",
     ]
-
-    def __init__(self, args, message, bot) -> None:
+    # episodes per DmcEpisodes request, -1 fetches a whole season at once
+    EPISODE_PAGE_SIZE: int = 30
+    # DmcEpisodes pages of one season requested concurrently
+    EPISODE_PREFETCH: int = 4
+
+    def __init__(
+        self,
+        args,
+        message,
+        bot,
+        page_size: int = EPISODE_PAGE_SIZE,
+        prefetch: int = EPISODE_PREFETCH,
+    ) -> None:
         self.bot = bot
+        self.page_size: int = page_size
+        self.prefetch: int = prefetch
 
         self.args: SimpleNamespace = args
         self.id: Optional[str] = self.get_id(self.args.url)
         if not hasattr(self, "disneysite"):
             self.bot.logging.error("Failed parse url!")
             raise Exception("Failed parse url!")
-        if not self.disneysite:
-            self._regions = [
-                "AR",
-                "BO",
-                "BR",
-                "CL",
-                "CO",
-                "CR",
-                "DO",
-                "EC",
-                "GT",
-                "HN",
-                "MX",
-                "NI",
-                "PA",
-                "PE",
-                "PY",
-                "SV",
-                "UY",
-                "VE",
-            ]
         self.quality: str = args.quality
         self.subtitles: Optional[set[str]] = self.args_to_set(args.slang)
         self.audios: Optional[set[str]] = self.args_to_set(args.alang)
@@ -63,6 +65,10 @@ class Data:
 
         self.seasons: dict[str, str] = dict()
         self.regions_all: list[str] = list()
+        # regions whose response was rate limited, failed or undecodable
+        self.regions_failed: list[str] = list()
+        # series regions with at least one episode matching the filters
+        self.regions_matched: list[str] = list()
         self.regions: list[str] = list()
         self.change: int = 0
         self.header: str = ""
@@ -100,7 +106,8 @@ class Data:
 
         return id
 
-    def generate_progress_bar(self, value, maximum):
+    @staticmethod
+    def generate_progress_bar(value, maximum):
         filled_length: float = 10 * value / maximum
         filled_char: str = "━"
         end_char: str = "╸"
@@ -163,22 +170,67 @@ class Data:
         else:
             return front + available + f"<code><b>{', '.join(self.regions)}</b></code>"
 
+    def available(self, region: str) -> bool:
+        """Whether the title matches the filters in `region`."""
+        return region in (self.regions_matched if self.series else self.regions)
+
     def add(self, region: str) -> None:
         self.regions.append(region)
         self.change += 1
 
-    async def get_lang(self, session, region, id):
+    async def get_lang(self, session, region, id, hits: Optional[int] = None):
+        page_size: int = self.page_size
+        if page_size < 1 or not hits:
+            return (await self.get_lang_page(session, region, id, -1, 1))[0]
+
+        counts: list[int] = [0, 0, 0, 0]
+        pages: int = math.ceil(hits / page_size)
+        more: bool = False
+        prefetch = asyncio.Semaphore(max(self.prefetch, 1))
+
+        async def fetch(page: int) -> None:
+            nonlocal more
+            async with prefetch:
+                page_counts, page_more = await self.get_lang_page(
+                    session, region, id, page_size, page
+                )
+            # pages are folded into the counts as they arrive, so at most
+            # `prefetch` pages of metadata are held at any time
+            for n, count in enumerate(page_counts):
+                counts[n] += count
+            if page == pages:
+                more = page_more
+
+        # a failed page cancels the others
+        try:
+            async with asyncio.TaskGroup() as group:
+                for page in range(1, pages + 1):
+                    group.create_task(fetch(page))
+        except ExceptionGroup as e:
+            for error in e.exceptions[1:]:
+                self.bot.logging.error(f"Failed to get episodes in {region}: {error}")
+            # surface the HTTP or decode error itself, as a single request would
+            raise e.exceptions[0] from e
+
+        # episodes_meta.hits can lag behind the actual episode list
+        while more:
+            pages += 1
+            await fetch(pages)
+
+        return tuple(counts)
+
+    async def get_lang_page(self, session, region, id, page_size: int, page: int):
         async with session.get(
-            f"https://disney.content.edge.bamgrid.com/svc/content/DmcEpisodes/version/6.1/region/{region}/audience/k-false,l-true/maturity/1899/language/en/seasonId/{id}/pageSize/-1/page/1"
+            f"https://disney.content.edge.bamgrid.com/svc/content/DmcEpisodes/version/6.1/region/{region}/audience/k-false,l-true/maturity/1899/language/en/seasonId/{id}/pageSize/{page_size}/page/{page}"
         ) as req:
             audio: int = 0
             forced: int = 0
             sub: int = 0
-            data_full = (
-                (await req.json())
-                .get("data", {})
-                .get("DmcEpisodes", {})
-                .get("videos", {})
+            matched: int = 0
+            episodes = (await req.json()).get("data", {}).get("DmcEpisodes", {})
+            data_full = episodes.get("videos", {})
+            more: bool = page_size > 0 and episodes.get("meta", {}).get(
+                "hasMore", len(data_full) >= page_size
             )
             if data_full:
                 for video in data_full:
@@ -214,7 +266,13 @@ class Data:
                         sub += 1
                     if self.subtitles and self.subtitles.issubset(subtitles_forced):
                         forced += 1
-            return (audio, sub, forced)
+                    if (not self.audios or self.audios.issubset(audios)) and (
+                        not self.subtitles
+                        or self.subtitles.issubset(subtitles)
+                        or self.subtitles.issubset(subtitles_forced)
+                    ):
+                        matched += 1
+            return (audio, sub, forced, matched), more
 
     async def get_data(self, regions: list[str], session: Any) -> None:
         if self.regions_in:
@@ -224,143 +282,270 @@ class Data:
         for n, region in enumerate(regions, start=1):
             self.checked[0] = n
             region = region.upper()
-            async with session.get(
-                "https://{site}.content.edge.bamgrid.com/svc/content/{type}/version/6.1/region/{region}/audience/k-false,l-true/maturity/1899/language/en/encoded{encoded}/{id}".format(
-                    type=["DmcVideoBundle", "DmcSeriesBundle"][self.series],
-                    site=["star", "disney"][self.disneysite],
-                    region=region,
-                    encoded=["FamilyId", "SeriesId"][self.series],
-                    id=self.id,
-                )
-            ) as req:
-                subtitles = set()
-                subtitles_forced: set[str] = set()
+            await self.check_region(session, region)
+            await self.update_message(region, regions)
 
-                if self.series:
-                    try:
-                        try:
-                            res_json = await req.json()
-                        except Exception as e:
-                            self.bot.logging.error(f"Failed to decode series info {e}")
-                            self.bot.logging.error(await req.text)
-                            res_json = {}
-       
-                        data_full = (
-                            res_json
-                            .get("data", {})
-                            .get("DmcSeriesBundle", {})
-                        )
-                        if data := data_full.get("seasons", {}).get("seasons", []):
-                            self.regions_all.append(region)
-                            self.regions.append(region)
-                            if not self.header:
-                                try:
-                                    title = data_full["episodes"]["videos"][0]["text"][
-                                        "title"
-                                    ]
-                                    self.header = f'<a href="https://{["starplus", "disneyplus"][self.disneysite]}.com/series/{title["slug"]["series"]["default"]["content"]}/{self.id}">{title["full"]["series"]["default"]["content"]}</a>'
-                                except IndexError:
-                                    pass
-                            eps = [
-                                (
-                                    x["seasonSequenceNumber"],
-                                    x["episodes_meta"]["hits"],
-                                    await self.get_lang(session, region, x["seasonId"]),
-                                )
-                                for x in data
-                                if not self.seasons_in
-                                or x["seasonSequenceNumber"]
-                                in range(self.seasons_in[0], self.seasons_in[1])
-                            ]
-                            if eps:
-                                if str(eps) in self.seasons.keys():
-                                    self.seasons[str(eps)][0].append(region)
-                                else:
-                                    self.seasons[str(eps)] = (
-                                        [region],
-                                        eps,
-                                        sum(x[1] for x in eps),
-                                    )
-                            self.change += 1
-                    except Exception as e:
-                        self.bot.logging.error(f"Failed to get series info: {e}")
+    async def check_region(self, session: Any, region: str) -> None:
+        async with session.get(
+            "https://{site}.content.edge.bamgrid.com/svc/content/{type}/version/6.1/region/{region}/audience/k-false,l-true/maturity/1899/language/en/encoded{encoded}/{id}".format(
+                type=["DmcVideoBundle", "DmcSeriesBundle"][self.series],
+                site=["star", "disney"][self.disneysite],
+                region=region,
+                encoded=["FamilyId", "SeriesId"][self.series],
+                id=self.id,
+            )
+        ) as req:
+            subtitles = set()
+            subtitles_forced: set[str] = set()
 
-                else:
+            if req.status != 200:
+                self.bot.logging.error(f"Failed to get info in {region}: {req.status}")
+                self.regions_failed.append(region)
+                return
+
+            if self.series:
+                try:
                     try:
-                        try:
-                            res_json = await req.json()
-                        except Exception as e:
-                            self.bot.logging.error(f"Failed to decode series info {e}")
-                            self.bot.logging.error(req.text)
-                            res_json = {}
-                        
-                        data = (
-                            res_json
-                            .get("data", {})
-                            .get("DmcVideoBundle", {})
-                            .get("video", {})
-                        )
-                        if data:
-                            self.regions_all.append(region)
-                            if not self.header:
-                                title = data["text"]["title"]
-                                self.header = f'<a href="https://disneyplus.com/movies/{title["slug"]["program"]["default"]["content"]}/{self.id}">{title["full"]["program"]["default"]["content"]}</a>'
-                            video_data = data.get("mediaMetadata")
-                            quality: str = video_data["format"]
-                            audios: set = set(
-                                x["language"] for x in video_data["audioTracks"]
-                            )
-                            subtitles = set(
-                                x["language"]
-                                for x in video_data["captions"]
-                                if x["trackType"] != "FORCED"
+                        res_json = await req.json()
+                    except Exception as e:
+                        self.bot.logging.error(f"Failed to decode series info {e}")
+                        self.bot.logging.error(await req.text())
+                        self.regions_failed.append(region)
+                        return
+
+                    data_full = (
+                        res_json
+                        .get("data", {})
+                        .get("DmcSeriesBundle", {})
+                    )
+                    if data := data_full.get("seasons", {}).get("seasons", []):
+                        self.regions_all.append(region)
+                        self.regions.append(region)
+                        if not self.header:
+                            try:
+                                title = data_full["episodes"]["videos"][0]["text"][
+                                    "title"
+                                ]
+                                self.header = f'<a href="https://{["starplus", "disneyplus"][self.disneysite]}.com/series/{title["slug"]["series"]["default"]["content"]}/{self.id}">{title["full"]["series"]["default"]["content"]}</a>'
+                            except IndexError:
+                                pass
+                        langs = [
+                            (
+                                x,
+                                await self.get_lang(
+                                    session,
+                                    region,
+                                    x["seasonId"],
+                                    x["episodes_meta"]["hits"],
+                                ),
                             )
-                            subtitles_forced = set(
-                                x["language"]
-                                for x in video_data["captions"]
-                                if x["trackType"] == "FORCED"
+                            for x in data
+                            if not self.seasons_in
+                            or x["seasonSequenceNumber"]
+                            in range(self.seasons_in[0], self.seasons_in[1])
+                        ]
+                        # the last count only tells if any episode matched
+                        eps = [
+                            (
+                                x["seasonSequenceNumber"],
+                                x["episodes_meta"]["hits"],
+                                counts[:3],
                             )
-                            if self.quality and self.quality.upper() != quality:
-                                continue
-                            if self.advandec:
-                                if self.subtitles and self.audios:
-                                    if (
-                                        self.subtitles.issubset(subtitles)
-                                        or self.subtitles.issubset(subtitles_forced)
-                                    ) and self.audios.issubset(audios):
-                                        self.add(region)
-                                elif self.subtitles and not self.audios:
-                                    if self.subtitles.issubset(
-                                        subtitles
-                                    ) or self.subtitles.issubset(subtitles_forced):
-                                        self.add(region)
-                                elif self.audios and not self.subtitles:
-                                    if self.audios.issubset(audios):
-                                        self.add(region)
+                            for x, counts in langs
+                        ]
+                        if any(counts[3] for _, counts in langs):
+                            self.regions_matched.append(region)
+                        if eps:
+                            if str(eps) in self.seasons.keys():
+                                self.seasons[str(eps)][0].append(region)
                             else:
-                                self.change += 1
-                                self.regions = self.regions_all
+                                self.seasons[str(eps)] = (
+                                    [region],
+                                    eps,
+                                    sum(x[1] for x in eps),
+                                )
+                        self.change += 1
+                except Exception as e:
+                    self.bot.logging.error(f"Failed to get series info: {e}")
 
+            else:
+                try:
+                    try:
+                        res_json = await req.json()
                     except Exception as e:
-                        self.bot.logging.error(f"Failed to get series info {e}")
-                change_ = 6 if self.series else 11
-                if (
-                    self.change == 1
-                    or self.change > change_
-                    or region == regions[-1].upper()
-                ) and self.regions:
-                    message: str = self.render
-                    if message != self.last_message:
-                        await edit_text(self.message, message)
-                        self.change = 2
-                        self.last_message = message
+                        self.bot.logging.error(f"Failed to decode series info {e}")
+                        self.bot.logging.error(await req.text())
+                        self.regions_failed.append(region)
+                        return
+
+                    data = (
+                        res_json
+                        .get("data", {})
+                        .get("DmcVideoBundle", {})
+                        .get("video", {})
+                    )
+                    if data:
+                        self.regions_all.append(region)
+                        if not self.header:
+                            title = data["text"]["title"]
+                            self.header = f'<a href="https://disneyplus.com/movies/{title["slug"]["program"]["default"]["content"]}/{self.id}">{title["full"]["program"]["default"]["content"]}</a>'
+                        video_data = data.get("mediaMetadata")
+                        quality: str = video_data["format"]
+                        audios: set = set(
+                            x["language"] for x in video_data["audioTracks"]
+                        )
+                        subtitles = set(
+                            x["language"]
+                            for x in video_data["captions"]
+                            if x["trackType"] != "FORCED"
+                        )
+                        subtitles_forced = set(
+                            x["language"]
+                            for x in video_data["captions"]
+                            if x["trackType"] == "FORCED"
+                        )
+                        if self.quality and self.quality.upper() != quality:
+                            return
+                        if self.advandec:
+                            if self.subtitles and self.audios:
+                                if (
+                                    self.subtitles.issubset(subtitles)
+                                    or self.subtitles.issubset(subtitles_forced)
+                                ) and self.audios.issubset(audios):
+                                    self.add(region)
+                            elif self.subtitles and not self.audios:
+                                if self.subtitles.issubset(
+                                    subtitles
+                                ) or self.subtitles.issubset(subtitles_forced):
+                                    self.add(region)
+                            elif self.audios and not self.subtitles:
+                                if self.audios.issubset(audios):
+                                    self.add(region)
+                        else:
+                            self.change += 1
+                            self.regions = self.regions_all
+
+                except Exception as e:
+                    self.bot.logging.error(f"Failed to get series info {e}")
+
+    async def update_message(self, region: str, regions: list[str]) -> None:
+        change_ = 6 if self.series else 11
+        if (
+            self.change == 1
+            or self.change > change_
+            or region == regions[-1].upper()
+        ) and self.regions:
+            message: str = self.render
+            if message != self.last_message:
+                await edit_text(self.message, message)
+                self.change = 2
+                self.last_message = message
+
+
+class Batch:
+    MAX_TITLES: int = 9
+
+    def __init__(self, titles: list[Data], message, bot) -> None:
+        self.bot = bot
+        self.titles: list[Data] = titles
+        self.message = message
+        # every title is parsed from the same arguments
+        self.regions_in: Optional[list[str]] = titles[0].regions_in
+
+        self.swept: list[str] = list()
+        self.change: int = 0
+        self.last_message: str = ""
+        self.checked = [0, 0]
+
+    @property
+    def regions(self) -> list[str]:
+        return [
+            region
+            for region in self.swept
+            if any(data.available(region) for data in self.titles)
+        ]
+
+    @property
+    def render(self) -> str:
+        if self.checked[0] != self.checked[1]:
+            front: str = f"🕐 Checking regions...   {Data.generate_progress_bar(self.checked[0], self.checked[1])}   {self.checked[0]}/{self.checked[1]} ({self.checked[0]/self.checked[1]:.0%})\n\n"
+        else:
+            front = f"✅ Checked {self.checked[0]} (100%)\n\n"
+
+        header: str = "\n".join(
+            f"<b>{n}.</b> {data.header or f'<code>{data.id}</code>'}  –  {sum(data.available(x) for x in self.swept)} regions"
+            for n, data in enumerate(self.titles, start=1)
+        )
+
+        matrix: dict[str, list[str]] = dict()
+        for region in self.regions:
+            row: str = " ".join(
+                str(n) if data.available(region) else "·"
+                for n, data in enumerate(self.titles, start=1)
+            )
+            matrix.setdefault(row, []).append(region)
+        rows = sorted(matrix.items(), key=lambda x: (x[0].count("·"), -len(x[1])))
+
+        return (
+            front
+            + header
+            + "\n\n"
+            + "\n".join(
+                f"<code>{row}</code>  –  <code>{', '.join(regions)}</code>"
+                for row, regions in rows
+            )
+        )
+
+    async def get_data(self, regions: list[str], session: Any) -> None:
+        if self.regions_in:
+            regions = self.regions_in
+        self.checked[1] = len(regions)
+
+        for n, region in enumerate(regions, start=1):
+            self.checked[0] = n
+            region = region.upper()
+            try:
+                # one failed title cancels the others
+                async with asyncio.TaskGroup() as group:
+                    for data in self.titles:
+                        group.create_task(data.check_region(session, region))
+            except ExceptionGroup as e:
+                raise e.exceptions[0] from e
+            self.swept.append(region)
+            if any(data.available(region) for data in self.titles):
+                self.change += 1
+            await self.update_message(region, regions)
+
+    async def update_message(self, region: str, regions: list[str]) -> None:
+        if (
+            self.change == 1
+            or self.change > 6
+            or region == regions[-1].upper()
+        ) and self.regions:
+            message: str = self.render
+            if message != self.last_message:
+                await edit_text(self.message, message)
+                self.change = 2
+                self.last_message = message
 
 
 class DisneyPlus:
-    def __init__(self, bot) -> None:
+    def __init__(self, bot, cache_dir: str = ".") -> None:
         self.session = None
         self.bot = bot
-        self._regions: list[str] = list()
+        self.catalogs: dict[str, RegionCatalog] = {
+            "disneyplus": RegionCatalog(
+                bot,
+                os.path.join(cache_dir, "regions_disneyplus.json"),
+                DISNEYPLUS_REGIONS,
+                source=registerdisney_source,
+            ),
+            "starplus": RegionCatalog(
+                bot,
+                os.path.join(cache_dir, "regions_starplus.json"),
+                STARPLUS_REGIONS,
+            ),
+        }
 
     async def init_session(self, bot) -> None:
         self.session = aiohttp.ClientSession(
@@ -372,157 +557,37 @@ class DisneyPlus:
             }
         )
 
-        self._regions = [
-            "AD",
-            "AG",
-            "AI",
-            "AL",
-            "AR",
-            "AS",
-            "AT",
-            "AU",
-            "AW",
-            "BA",
-            "BB",
-            "BE",
-            "BG",
-            "BL",
-            "BM",
-            "BO",
-            "BQ",
-            "BR",
-            "BS",
-            "BZ",
-            "CA",
-            "CC",
-            "CH",
-            "CK",
-            "CL",
-            "CO",
-            "CR",
-            "CW",
-            "CX",
-            "CZ",
-            "DE",
-            "DK",
-            "DM",
-            "DO",
-            "EC",
-            "EE",
-            "ES",
-            "FI",
-            "FK",
-            "FO",
-            "FR",
-            "GB",
-            "GD",
-            "GF",
-            "GG",
-            "GI",
-            "GL",
-            "GP",
-            "GR",
-            "GS",
-            "GT",
-            "GU",
-            "GY",
-            "HK",
-            "HN",
-            "HR",
-            "HT",
-            "HU",
-            "IE",
-            "IM",
-            "IO",
-            "IS",
-            "IT",
-            "JE",
-            "JM",
-            "JP",
-            "KN",
-            "KR",
-            "KY",
-            "LC",
-            "LI",
-            "LT",
-            "LU",
-            "LV",
-            "MC",
-            "ME",
-            "MF",
-            "MH",
-            "MK",
-            "MP",
-            "MQ",
-            "MS",
-            "MT",
-            "MU",
-            "MX",
-            "NC",
-            "NF",
-            "NI",
-            "NL",
-            "NO",
-            "NU",
-            "NZ",
-            "PA",
-            "PE",
-            "PF",
-            "PL",
-            "PM",
-            "PN",
-            "PR",
-            "PT",
-            "PY",
-            "RE",
-            "RO",
-            "RS",
-            "SE",
-            "SG",
-            "SH",
-            "SI",
-            "SJ",
-            "SK",
-            "SM",
-            "SR",
-            "SV",
-            "SX",
-            "TC",
-            "TF",
-            "TK",
-            "TR",
-            "TT",
-            "TW",
-            "UM",
-            "US",
-            "UY",
-            "VA",
-            "VC",
-            "VE",
-            "VG",
-            "VI",
-            "WF",
-            "YT",
-        ]  # dsnp
-
-        # async with self.session.get(
-        #    "https://cdn.registerdisney.go.com/jgc/v9/client/DTCI-DISNEYPLUS.GC.WEB-PROD/configuration/site",
-        # ) as req:
-        #    try:
-        #        self._regions = (
-        #            (await req.json())
-        #            .get("data", {})
-        #            .get("compliance", {})
-        #            .get("countries", [])
-        #        )
-        #    except Exception as e:
-        #        self.bot.logging.error(f"Failed to get regions {e}")
+        # the built-in lists are used until the persisted ones are loaded
+        for catalog in self.catalogs.values():
+            catalog.start(self.session)
 
     @property
     def regions(self) -> list[str]:
-        return self._regions
+        return self.catalogs["disneyplus"].regions
+
+    def catalog(self, data: Data) -> RegionCatalog:
+        return self.catalogs[["starplus", "disneyplus"][data.disneysite]]
+
+    async def get_available(self, data: Data | Batch) -> None:
+        titles: list[Data] = data.titles if isinstance(data, Batch) else [data]
+        catalogs: dict[RegionCatalog, list[str]] = {
+            catalog: catalog.sweep_regions()
+            for catalog in dict.fromkeys(self.catalog(title) for title in titles)
+        }
+        regions: list[str] = list(
+            dict.fromkeys(x for swept in catalogs.values() for x in swept)
+        )
 
-    async def get_available(self, data: Data) -> None:
-        await data.get_data(self._regions, self.session)
+        await data.get_data(regions, self.session)
+
+        if not data.regions_in:
+            for catalog, swept in catalogs.items():
+                found: set[str] = set()
+                failed: set[str] = set()
+                for title in titles:
+                    if self.catalog(title) is catalog:
+                        found.update(title.regions_all)
+                        failed.update(title.regions_failed)
+                await catalog.record([x for x in swept if x not in failed], found)
         if not data.regions:
             await edit_text(data.message, "Not available in any region.")
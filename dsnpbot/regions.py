@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import json
+import os
+import time
+
+
+RegionSource = Callable[[Any], Awaitable[list[str]]]
+
+DISNEYPLUS_REGIONS: list[str] = [
+    "AD",
+    "AG",
+    "AI",
+    "AL",
+    "AR",
+    "AS",
+    "AT",
+    "AU",
+    "AW",
+    "BA",
+    "BB",
+    "BE",
+    "BG",
+    "BL",
+    "BM",
+    "BO",
+    "BQ",
+    "BR",
+    "BS",
+    "BZ",
+    "CA",
+    "CC",
+    "CH",
+    "CK",
+    "CL",
+    "CO",
+    "CR",
+    "CW",
+    "CX",
+    "CZ",
+    "DE",
+    "DK",
+    "DM",
+    "DO",
+    "EC",
+    "EE",
+    "ES",
+    "FI",
+    "FK",
+    "FO",
+    "FR",
+    "GB",
+    "GD",
+    "GF",
+    "GG",
+    "GI",
+    "GL",
+    "GP",
+    "GR",
+    "GS",
+    "GT",
+    "GU",
+    "GY",
+    "HK",
+    "HN",
+    "HR",
+    "HT",
+    "HU",
+    "IE",
+    "IM",
+    "IO",
+    "IS",
+    "IT",
+    "JE",
+    "JM",
+    "JP",
+    "KN",
+    "KR",
+    "KY",
+    "LC",
+    "LI",
+    "LT",
+    "LU",
+    "LV",
+    "MC",
+    "ME",
+    "MF",
+    "MH",
+    "MK",
+    "MP",
+    "MQ",
+    "MS",
+    "MT",
+    "MU",
+    "MX",
+    "NC",
+    "NF",
+    "NI",
+    "NL",
+    "NO",
+    "NU",
+    "NZ",
+    "PA",
+    "PE",
+    "PF",
+    "PL",
+    "PM",
+    "PN",
+    "PR",
+    "PT",
+    "PY",
+    "RE",
+    "RO",
+    "RS",
+    "SE",
+    "SG",
+    "SH",
+    "SI",
+    "SJ",
+    "SK",
+    "SM",
+    "SR",
+    "SV",
+    "SX",
+    "TC",
+    "TF",
+    "TK",
+    "TR",
+    "TT",
+    "TW",
+    "UM",
+    "US",
+    "UY",
+    "VA",
+    "VC",
+    "VE",
+    "VG",
+    "VI",
+    "WF",
+    "YT",
+]
+
+STARPLUS_REGIONS: list[str] = [
+    "AR",
+    "BO",
+    "BR",
+    "CL",
+    "CO",
+    "CR",
+    "DO",
+    "EC",
+    "GT",
+    "HN",
+    "MX",
+    "NI",
+    "PA",
+    "PE",
+    "PY",
+    "SV",
+    "UY",
+    "VE",
+]
+
+
+async def registerdisney_source(session: Any) -> list[str]:
+    async with session.get(
+        "https://cdn.registerdisney.go.com/jgc/v9/client/DTCI-DISNEYPLUS.GC.WEB-PROD/configuration/site",
+    ) as req:
+        return (
+            (await req.json())
+            .get("data", {})
+            .get("compliance", {})
+            .get("countries", [])
+        )
+
+
+class RegionCatalog:
+    def __init__(
+        self,
+        bot,
+        path: str,
+        default: list[str],
+        source: Optional[RegionSource] = None,
+        refresh_interval: float = 24 * 60 * 60,
+        prune_after: int = 25,
+        prune_ttl: float = 7 * 24 * 60 * 60,
+        wide_ratio: float = 0.5,
+        min_regions: Optional[int] = None,
+    ) -> None:
+        self.bot = bot
+        self.path: str = path
+        self.source: Optional[RegionSource] = source
+        self.refresh_interval: float = refresh_interval
+        self.prune_after: int = prune_after
+        self.prune_ttl: float = prune_ttl
+        # a sweep only counts misses if the titles were found in this share
+        # of the regions, most titles are simply not licensed everywhere
+        self.wide_ratio: float = wide_ratio
+        # pruning never shrinks the catalog below this
+        self.min_regions: int = (
+            len(default) // 2 if min_regions is None else min_regions
+        )
+
+        self._regions: list[str] = list(default)
+        # consecutive full sweeps in which no title was found in the region
+        self.misses: dict[str, int] = dict()
+        # pruned region -> time it was pruned
+        self.pruned: dict[str, float] = dict()
+        self._probe: int = 0
+        self._task: Optional[asyncio.Task] = None
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def regions(self) -> list[str]:
+        now: float = time.time()
+        for region, pruned in list(self.pruned.items()):
+            if now - pruned > self.prune_ttl:
+                # give it another chance, the catalog may have grown back
+                del self.pruned[region]
+                self.misses.pop(region, None)
+
+        return [x for x in self._regions if x not in self.pruned]
+
+    def sweep_regions(self) -> list[str]:
+        """The regions to sweep, plus one pruned region to see if it is back."""
+        regions: list[str] = self.regions
+        if pruned := sorted(x for x in self.pruned if x in self._regions):
+            regions.append(pruned[self._probe % len(pruned)])
+            self._probe += 1
+
+        return regions
+
+    def start(self, session: Any) -> None:
+        """Loads the persisted list and keeps refreshing it in the background."""
+        self._task = asyncio.create_task(self._run(session))
+
+    async def _run(self, session: Any) -> None:
+        await self.load()
+        if not self.source:
+            return
+        while True:
+            try:
+                await self.refresh(session)
+            except Exception as e:
+                self.bot.logging.error(f"Failed to refresh regions {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            data = await asyncio.to_thread(self._read)
+            if not isinstance(data, dict):
+                raise ValueError("not a JSON object")
+            regions = data.get("regions", [])
+            if not isinstance(regions, list) or not all(
+                isinstance(x, str) for x in regions
+            ):
+                raise ValueError("regions is not a list of region codes")
+            misses = data.get("misses", {})
+            pruned = data.get("pruned", {})
+            if not isinstance(misses, dict) or not isinstance(pruned, dict):
+                raise ValueError("misses and pruned must be JSON objects")
+            # drop entries that would break the counters later
+            misses = {
+                k: v
+                for k, v in misses.items()
+                if isinstance(v, int) and not isinstance(v, bool)
+            }
+            pruned = {
+                k: v
+                for k, v in pruned.items()
+                if isinstance(v, (int, float)) and not isinstance(v, bool)
+            }
+        except Exception as e:
+            self.bot.logging.error(f"Failed to load regions from {self.path}: {e}")
+            return
+
+        if regions:
+            self._regions = regions
+        self.misses = misses | self.misses
+        self.pruned = pruned | self.pruned
+
+    async def save(self) -> None:
+        # snapshot on the event loop, record() may change the dicts meanwhile
+        data: dict = {
+            "regions": list(self._regions),
+            "misses": dict(self.misses),
+            "pruned": dict(self.pruned),
+        }
+        try:
+            async with self._save_lock:
+                await asyncio.to_thread(self._write, data)
+        except Exception as e:
+            self.bot.logging.error(f"Failed to save regions to {self.path}: {e}")
+
+    def _read(self) -> dict:
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, data: dict) -> None:
+        tmp: str = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    async def refresh(self, session: Any) -> None:
+        try:
+            regions: list[str] = await self.source(session)
+            if not isinstance(regions, list) or not all(
+                isinstance(x, str) for x in regions
+            ):
+                raise ValueError(f"not a list of region codes: {regions!r:.100}")
+        except Exception as e:
+            self.bot.logging.error(f"Failed to get regions {e}")
+            return
+
+        if not regions:
+            self.bot.logging.warning(
+                "Region source returned no regions, keeping the old list"
+            )
+            return
+
+        self._regions = sorted(set(x.upper() for x in regions))
+        self.misses = {k: v for k, v in self.misses.items() if k in self._regions}
+        self.bot.logging.info(f"Refreshed regions: {len(self._regions)}")
+        await self.save()
+
+    async def record(self, regions: list[str], found: set[str]) -> None:
+        """Updates the miss counters after a full sweep over `regions`."""
+        for region in regions:
+            if region in self.pruned and region in found:
+                self.bot.logging.info(f"Restored region: {region}")
+                del self.pruned[region]
+
+        active: list[str] = [x for x in regions if x not in self.pruned]
+        # a region missing a title that is available almost everywhere is
+        # suspicious, one missing a region-restricted title is not
+        if len(found.intersection(active)) > self.wide_ratio * len(active):
+            for region in active:
+                if region in found:
+                    self.misses.pop(region, None)
+                    continue
+                self.misses[region] = self.misses.get(region, 0) + 1
+                if (
+                    self.misses[region] >= self.prune_after
+                    and len(self.regions) > self.min_regions
+                ):
+                    self.bot.logging.info(f"Pruned region: {region}")
+                    self.pruned[region] = time.time()
+                    del self.misses[region]
+        await self.save()